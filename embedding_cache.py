@@ -0,0 +1,128 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from openai import APIStatusError
+
+logger = logging.getLogger(__name__)
+
+# Two-tier cache: in-process LRU (L1) in front of a sqlite table on disk (L2)
+DEFAULT_CACHE_PATH = "embedding_cache.sqlite"
+L1_MAX_ENTRIES = 10000
+EMBED_MAX_RETRIES = 5
+
+_l1 = OrderedDict()
+_lock = threading.Lock()
+_conn = None
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        # Resolved lazily so a .env loaded by the importing script is honoured
+        cache_path = os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+        _conn = sqlite3.connect(cache_path, check_same_thread=False)
+        _conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vec BLOB)")
+        _conn.commit()
+    return _conn
+
+def make_key(text, model):
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+def _l1_put(key, vec):
+    _l1[key] = vec
+    _l1.move_to_end(key)
+    if len(_l1) > L1_MAX_ENTRIES:
+        _l1.popitem(last=False)
+
+def _lookup(keys):
+    """Returns {key: vector} for every key found in L1 or L2. Caller must hold _lock."""
+    found = {}
+    missing = []
+    for key in keys:
+        if key in _l1:
+            _l1.move_to_end(key)
+            found[key] = _l1[key]
+        else:
+            missing.append(key)
+
+    conn = _get_conn()
+    # Stay well under sqlite's bound-parameter limit
+    for i in range(0, len(missing), 500):
+        part = missing[i:i + 500]
+        placeholders = ",".join("?" * len(part))
+        rows = conn.execute(f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})", part)
+        for key, blob in rows:
+            vec = np.frombuffer(blob, dtype=np.float32)
+            _l1_put(key, vec)
+            found[key] = vec
+    return found
+
+def _store(items):
+    """Writes (key, vector) pairs to both tiers. Caller must hold _lock."""
+    conn = _get_conn()
+    conn.executemany(
+        "INSERT OR IGNORE INTO embeddings (key, vec) VALUES (?, ?)",
+        [(key, vec.tobytes()) for key, vec in items]
+    )
+    conn.commit()
+    for key, vec in items:
+        _l1_put(key, vec)
+
+def embed_texts(client, texts, model):
+    """
+    Embeds a list of strings in a single request, retrying with exponential backoff
+    on rate limiting (429) and server errors (5xx). Returns vectors in input order.
+    """
+    for attempt in range(EMBED_MAX_RETRIES):
+        try:
+            response = client.embeddings.create(input=texts, model=model)
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        except APIStatusError as e:
+            # RateLimitError (429) is an APIStatusError subclass
+            retryable = e.status_code == 429 or e.status_code >= 500
+            if not retryable or attempt == EMBED_MAX_RETRIES - 1:
+                raise
+            delay = 2 ** attempt
+            logger.warning(f"  Embedding request failed ({e.status_code}), retrying in {delay}s...")
+            time.sleep(delay)
+
+def vector_to_list(vec):
+    """
+    Converts a float32 vector to a compact JSON-friendly list by rounding to 8 decimal
+    places, which drops the float64 noise digits .tolist() would otherwise serialize.
+    This is an absolute bound (error <= 5e-9), not a significant-digit one: components
+    below ~0.01 keep fewer digits than float32 holds, which is negligible for cosine scoring.
+    """
+    return np.round(vec.astype(np.float64), 8).tolist()
+
+def get_or_embed_batch(texts, model, client):
+    """
+    Returns embeddings for texts as a float32 matrix (one row per text), calling
+    the embeddings API only for texts not already cached for this model.
+    """
+    keys = [make_key(text, model) for text in texts]
+    with _lock:
+        found = _lookup(keys)
+
+    # Send each distinct miss once
+    misses = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in misses:
+            misses[key] = text
+
+    if misses:
+        vectors = embed_texts(client, list(misses.values()), model)
+        new_items = [(key, np.asarray(vec, dtype=np.float32)) for key, vec in zip(misses, vectors)]
+        with _lock:
+            _store(new_items)
+        found.update(new_items)
+
+    return np.vstack([found[key] for key in keys])
+
+def get_or_embed(text, model, client):
+    """Returns the embedding for a single text as a list of floats, using the cache when possible."""
+    return vector_to_list(get_or_embed_batch([text], model, client)[0])
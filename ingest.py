@@ -1,6 +1,7 @@
+import io
 import os
-import json
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from azure.storage.blob import BlobServiceClient
 from azure.ai.documentintelligence import DocumentIntelligenceClient
@@ -13,12 +14,69 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Number of blobs downloaded and analyzed concurrently
+MAX_WORKERS = 16
+
+# Per-blob download tuning: ranged GETs of this size, fetched in parallel
+DOWNLOAD_CONCURRENCY = 8
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
 def get_required_env_var(name):
     value = os.getenv(name)
     if not value:
         raise ValueError(f"Missing required environment variable: {name}")
     return value
 
+def process_blob(blob, container_client, di_client, output_dir):
+    """
+    Downloads a single blob, analyzes it with Document Intelligence and saves the extracted text.
+    Returns the output path, or None if the blob was skipped.
+    """
+    logger.info(f"Processing: {blob.name}")
+
+    # Filter out directories if any (though usually blobs are files)
+    if blob.size == 0:
+        logger.info(f"Skipping empty/directory blob: {blob.name}")
+        return None
+
+    # Filter for PDF files only
+    if not blob.name.lower().endswith('.pdf'):
+        logger.info(f"Skipping non-PDF file: {blob.name}")
+        return None
+
+    # Download blob content (ranged GETs in parallel for larger blobs)
+    # readinto writes straight into the buffer, avoiding the extra copy made by readall
+    blob_client = container_client.get_blob_client(blob)
+    blob_data = io.BytesIO()
+    blob_client.download_blob(max_concurrency=DOWNLOAD_CONCURRENCY).readinto(blob_data)
+    blob_data.seek(0)
+
+    # Analyze with Document Intelligence
+    # Polling logic is handled by the SDK's begin_analyze_document
+    # Using 'prebuilt-layout' as requested
+    poller = di_client.begin_analyze_document(
+        "prebuilt-layout",
+        body=blob_data,
+        content_type="application/octet-stream",
+        polling_interval=2
+    )
+    result = poller.result()
+
+    # Save result to Text
+    # Create a filename safe version of the blob name (replacing / with _)
+    safe_filename = blob.name.replace("/", "_") + ".txt"
+    output_path = os.path.join(output_dir, safe_filename)
+
+    # Extract content
+    # The 'content' field in the AnalyzeResult object contains the concatenated text
+    extracted_text = result.content
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(extracted_text)
+
+    logger.info(f"Saved extracted text to: {output_path}")
+    return output_path
+
 def main():
     try:
         # Configuration
@@ -28,8 +86,12 @@ def main():
         container_name = get_required_env_var("AZ_STORAGE_CONTAINER")
         prefix = os.getenv("AZ_STORAGE_PREFIX", "")
 
-        # Initialize clients
-        blob_service_client = BlobServiceClient.from_connection_string(storage_conn_str)
+        # Initialize clients (shared across worker threads; both SDK clients are thread-safe)
+        blob_service_client = BlobServiceClient.from_connection_string(
+            storage_conn_str,
+            max_single_get_size=DOWNLOAD_CHUNK_SIZE,
+            max_chunk_get_size=DOWNLOAD_CHUNK_SIZE
+        )
         di_client = DocumentIntelligenceClient(endpoint=di_endpoint, credential=AzureKeyCredential(di_key))
         
         container_client = blob_service_client.get_container_client(container_name)
@@ -40,53 +102,19 @@ def main():
 
         logger.info(f"Connected to container '{container_name}'. Searching for blobs with prefix '{prefix}'...")
 
-        # Iterate through blobs
+        # Download and analyze blobs concurrently; the work is network-bound
         blobs = container_client.list_blobs(name_starts_with=prefix)
-        for blob in blobs:
-            try:
-                logger.info(f"Processing: {blob.name}")
-                
-                # Filter out directories if any (though usually blobs are files)
-                if blob.size == 0: 
-                     logger.info(f"Skipping empty/directory blob: {blob.name}")
-                     continue
-
-                # Filter for PDF files only
-                if not blob.name.lower().endswith('.pdf'):
-                    logger.info(f"Skipping non-PDF file: {blob.name}")
-                    continue
-
-                # Download blob content
-                blob_client = container_client.get_blob_client(blob)
-                blob_data = blob_client.download_blob().readall()
-
-                # Analyze with Document Intelligence
-                # Polling logic is handled by the SDK's begin_analyze_document
-                # Using 'prebuilt-layout' as requested
-                poller = di_client.begin_analyze_document(
-                    "prebuilt-layout", 
-                    body=blob_data,
-                    content_type="application/octet-stream"
-                )
-                result = poller.result()
-
-                # Save result to Text
-                # Create a filename safe version of the blob name (replacing / with _)
-                safe_filename = blob.name.replace("/", "_") + ".txt"
-                output_path = os.path.join(output_dir, safe_filename)
-
-                # Extract content
-                # The 'content' field in the AnalyzeResult object contains the concatenated text
-                extracted_text = result.content
-                
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write(extracted_text)
-                
-                logger.info(f"Saved extracted text to: {output_path}")
-
-            except Exception as e:
-                logger.error(f"Failed to process {blob.name}: {e}")
-                continue
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(process_blob, blob, container_client, di_client, output_dir): blob
+                for blob in blobs
+            }
+            for future in as_completed(futures):
+                blob = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Failed to process {blob.name}: {e}")
 
         logger.info("Ingestion complete.")
 
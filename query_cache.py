@@ -0,0 +1,64 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+
+# Semantic cache for search results: a new query reuses the results of a
+# previous query whose embedding is nearly identical (cosine similarity).
+DEFAULT_CACHE_PATH = "query_cache.sqlite"
+SIMILARITY_THRESHOLD = 0.95
+TTL_SECONDS = 3600  # Expire entries so results do not go stale after a re-index
+
+_lock = threading.Lock()
+_conn = None
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        cache_path = os.getenv("QUERY_CACHE_PATH", DEFAULT_CACHE_PATH)
+        _conn = sqlite3.connect(cache_path, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS qcache "
+            "(namespace TEXT, query TEXT, vec BLOB, result_json TEXT, ts INT)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS qcache_ns_ts ON qcache (namespace, ts)")
+        _conn.commit()
+    return _conn
+
+def lookup(query_vector, namespace=""):
+    """Returns cached results for the most similar unexpired query, or None."""
+    cutoff = int(time.time()) - TTL_SECONDS
+    with _lock:
+        rows = _get_conn().execute(
+            "SELECT vec, result_json FROM qcache WHERE namespace = ? AND ts >= ?",
+            (namespace, cutoff)
+        ).fetchall()
+    q = np.asarray(query_vector, dtype=np.float32)
+    # Ignore entries of a different dimension (e.g. written by another model)
+    rows = [row for row in rows if len(row[0]) == q.nbytes]
+    if not rows:
+        return None
+
+    matrix = np.vstack([np.frombuffer(vec, dtype=np.float32) for vec, _ in rows])
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(q)
+    similarities = (matrix @ q) / np.maximum(norms, 1e-12)
+
+    best = int(np.argmax(similarities))
+    if similarities[best] < SIMILARITY_THRESHOLD:
+        return None
+    return json.loads(rows[best][1])
+
+def store(query_text, query_vector, results, namespace=""):
+    """Caches results for a query and drops expired entries."""
+    now = int(time.time())
+    vec = np.asarray(query_vector, dtype=np.float32).tobytes()
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM qcache WHERE ts < ?", (now - TTL_SECONDS,))
+        conn.execute(
+            "INSERT INTO qcache (namespace, query, vec, result_json, ts) VALUES (?, ?, ?, ?, ?)",
+            (namespace, query_text, vec, json.dumps(results), now)
+        )
+        conn.commit()
@@ -1,8 +1,12 @@
 import os
+import re
+import mmap
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
+from azure.core.exceptions import ResourceNotFoundError
+from azure.search.documents import SearchIndexingBufferedSender
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     SearchIndex,
@@ -16,8 +20,10 @@ from azure.search.documents.indexes.models import (
     AzureOpenAIVectorizer,
     AzureOpenAIVectorizerParameters
 )
+import tiktoken
 from openai import AzureOpenAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from semchunk import chunkerify
+from embedding_cache import get_or_embed_batch, vector_to_list
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -32,6 +38,148 @@ def get_required_env_var(name):
         raise ValueError(f"Missing required environment variable: {name}")
     return value
 
+# Document keys may only contain letters, digits, dashes, underscores and '='
+_ID_SANITIZE = re.compile(r'[^a-zA-Z0-9_\-=]')
+_ID_TRANS = str.maketrans({'.': '_', ' ': '', '-': '_'})
+
+# Number of files chunked and embedded concurrently
+MAX_WORKERS = 8
+
+# Buffered uploads: the sender batches across files and retries failed actions.
+# The service caps a request at 1000 documents / 16 MB. A document is ~19 KB of
+# vector JSON plus up to ~2 KB of chunk text, so 250 keeps full batches well
+# under the limit; the sender's split-on-413 is only a fallback.
+UPLOAD_BATCH_SIZE = 250
+UPLOAD_FLUSH_INTERVAL = 60
+
+# Chunk sizes are measured in embedding-model tokens, not characters
+CHUNK_SIZE = 512
+CHUNK_OVERLAP = 64
+_ENCODING = tiktoken.encoding_for_model("text-embedding-ada-002")
+
+# Chunks shorter than this carry no signal worth an embedding
+MIN_CHUNK_CHARS = 50
+MIN_CHUNK_TOKENS = 100
+
+# Embedding request limits: flush a batch at whichever cap is reached first
+EMBED_BATCH_SIZE = 64
+EMBED_BATCH_TOKENS = 8000
+
+def count_tokens(text):
+    return len(_ENCODING.encode(text, disallowed_special=()))
+
+def read_text(file_path):
+    """Reads a UTF-8 text file, decoding directly from a memory map to avoid an intermediate read buffer."""
+    with open(file_path, "rb") as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Match text-mode open(): normalize Windows/old-Mac line endings to \n
+            return str(mm, "utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+def clean_chunks(text, chunks, offsets):
+    """
+    Drops whitespace-only / boilerplate chunks and merges fragments below
+    MIN_CHUNK_TOKENS into the preceding chunk while it stays within CHUNK_SIZE.
+    Merges take the source span covering both chunks (via the chunker's offsets),
+    so the text the two chunks overlap on is not duplicated.
+    Returns (chunk, token_count) pairs so later stages need not re-tokenize.
+    """
+    merged = []  # [start, end, token_count]
+    can_merge = False
+    for chunk, (start, end) in zip(chunks, offsets):
+        if len("".join(chunk.split())) < MIN_CHUNK_CHARS or not any(ch.isalnum() for ch in chunk):
+            # Never merge across a dropped chunk, or its boilerplate would come back
+            can_merge = False
+            continue
+        tokens = count_tokens(chunk)
+        if (
+            can_merge
+            and (tokens < MIN_CHUNK_TOKENS or merged[-1][2] < MIN_CHUNK_TOKENS)
+            and merged[-1][2] + tokens <= CHUNK_SIZE
+        ):
+            merged[-1][1] = end
+            merged[-1][2] = count_tokens(text[merged[-1][0]:end])
+        else:
+            merged.append([start, end, tokens])
+        can_merge = True
+    return [(text[start:end], tokens) for start, end, tokens in merged]
+
+def iter_batches(chunks):
+    """
+    Takes (chunk, token_count) pairs and yields (start_index, batch) pairs
+    capped by EMBED_BATCH_SIZE and EMBED_BATCH_TOKENS.
+    """
+    batch = []
+    batch_tokens = 0
+    start = 0
+    for i, (chunk, tokens) in enumerate(chunks):
+        if batch and (len(batch) >= EMBED_BATCH_SIZE or batch_tokens + tokens > EMBED_BATCH_TOKENS):
+            yield start, batch
+            batch = []
+            batch_tokens = 0
+            start = i
+        batch.append(chunk)
+        batch_tokens += tokens
+    # Flush partial batch at end-of-file
+    if batch:
+        yield start, batch
+
+def process_file(filename, processed_dir, chunker, openai_client, embedding_deployment):
+    """Chunks and embeds a single processed text file, returning its documents for upload."""
+    file_path = os.path.join(processed_dir, filename)
+    logger.info(f"Processing '{filename}'...")
+
+    text_content = read_text(file_path)
+
+    # Chunking
+    chunks, offsets = chunker(text_content, overlap=CHUNK_OVERLAP, offsets=True)
+    chunks = clean_chunks(text_content, chunks, offsets)
+    logger.info(f"  Split '{filename}' into {len(chunks)} chunks.")
+
+    documents_to_upload = []
+
+    for start, batch in iter_batches(chunks):
+        try:
+            # Generate Embeddings for the whole batch in one request (cached chunks are skipped)
+            # Returned as a float32 matrix: ~6KB per 1536-dim vector held in memory until upload
+            embeddings = get_or_embed_batch(batch, embedding_deployment, openai_client)
+        except Exception as e:
+            logger.error(f"  Error embedding chunks {start}-{start + len(batch) - 1} of '{filename}': {e}")
+            continue
+
+        for i, (chunk, embedding) in enumerate(zip(batch, embeddings), start=start):
+            # Unique ID for each chunk
+            # Using filename (sanitized) + chunk index
+            # Ensure ID is safe for Azure Search (letters, numbers, dashes, underscores, =, etc)
+            # We'll use a simple hash or safe string.
+            # Let's base64 encode or just safe replacements.
+
+            # Make a safe ID and clean remaining unsafe chars
+            safe_id = _ID_SANITIZE.sub('', f"{filename}_{i}".translate(_ID_TRANS))
+
+            # Create Document
+            doc = {
+                "id": safe_id,
+                "content": chunk,
+                "source_file": filename,
+                "embedding": embedding
+            }
+            documents_to_upload.append(doc)
+
+    return documents_to_upload
+
+def to_upload_document(doc):
+    # Vectors stay packed float32 until the SDK needs JSON-serializable lists;
+    # rounding keeps the serialized vector at ~19 KB instead of ~34 KB
+    return {**doc, "embedding": vector_to_list(doc["embedding"])}
+
+def log_upload_error(action):
+    # IndexAction is a mapping-style model; read the key the same way the SDK does.
+    # This runs inside the sender's flush, so it must never raise.
+    logger.error(f"  Error uploading document '{action.get('id')}'.")
+
 def main():
     try:
         # Configuration
@@ -53,11 +201,16 @@ def main():
 
         # Initialize Azure Search Clients
         index_client = SearchIndexClient(endpoint=search_endpoint, credential=AzureKeyCredential(search_key))
-        search_client = SearchClient(endpoint=search_endpoint, index_name=index_name, credential=AzureKeyCredential(search_key))
 
         # 1. Re-create Index to ensure schema matches
         logger.info(f"Checking if index '{index_name}' exists...")
-        if index_name in [name for name in index_client.list_index_names()]:
+        try:
+            index_client.get_index(index_name)
+            index_exists = True
+        except ResourceNotFoundError:
+            index_exists = False
+
+        if index_exists:
             logger.info(f"Index '{index_name}' exists. Deleting to ensure schema match...")
             index_client.delete_index(index_name)
         
@@ -115,70 +268,43 @@ def main():
             logger.error(f"Directory '{processed_dir}' not found.")
             return
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
+        chunker = chunkerify(count_tokens, chunk_size=CHUNK_SIZE)
 
         files = [f for f in os.listdir(processed_dir) if f.lower().endswith(".txt")]
         logger.info(f"Found {len(files)} text files in '{processed_dir}'.")
 
-        for filename in files:
-            file_path = os.path.join(processed_dir, filename)
-            logger.info(f"Processing '{filename}'...")
-            
-            with open(file_path, "r", encoding="utf-8") as f:
-                text_content = f.read()
-
-            # Chunking
-            chunks = text_splitter.split_text(text_content)
-            logger.info(f"  Split into {len(chunks)} chunks.")
-
-            documents_to_upload = []
-            
-            for i, chunk in enumerate(chunks):
-                # Unique ID for each chunk
-                # Using filename (sanitized) + chunk index
-                # Ensure ID is safe for Azure Search (letters, numbers, dashes, underscores, =, etc)
-                # We'll use a simple hash or safe string.
-                # Let's base64 encode or just safe replacements.
-                
-                # Make a safe ID
-                safe_id = f"{filename}_{i}".replace(".", "_").replace(" ", "").replace("-", "_")
-                # Alternatively verify regex: ^[a-zA-Z0-9_\-=]+$
-                # clean unsafe chars
-                import re
-                safe_id = re.sub(r'[^a-zA-Z0-9_\-=]', '', safe_id)
-
+        # Files are independent: overlap their embedding round trips.
+        # Finished documents go to the buffered sender, which uploads full batches
+        # across file boundaries while the remaining files are still embedding.
+        with SearchIndexingBufferedSender(
+            endpoint=search_endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(search_key),
+            auto_flush_interval=UPLOAD_FLUSH_INTERVAL,
+            initial_batch_action_count=UPLOAD_BATCH_SIZE,
+            on_error=log_upload_error
+        ) as sender, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    process_file, filename, processed_dir, chunker,
+                    openai_client, embedding_deployment
+                ): filename
+                for filename in files
+            }
+            for future in as_completed(futures):
+                filename = futures[future]
                 try:
-                    # Generate Embedding
-                    response = openai_client.embeddings.create(
-                        input=chunk,
-                        model=embedding_deployment
-                    )
-                    embedding = response.data[0].embedding
-
-                    # Create Document
-                    doc = {
-                        "id": safe_id,
-                        "content": chunk,
-                        "source_file": filename,
-                        "embedding": embedding
-                    }
-                    documents_to_upload.append(doc)
-                    
+                    documents = future.result()
                 except Exception as e:
-                    logger.error(f"  Error embedding chunk {i}: {e}")
+                    logger.error(f"Failed to process '{filename}': {e}")
                     continue
 
-            # Upload Batch
-            if documents_to_upload:
-                try:
-                    result = search_client.upload_documents(documents=documents_to_upload)
-                    logger.info(f"  Uploaded {len(documents_to_upload)} chunks from '{filename}'.")
-                except Exception as e:
-                    logger.error(f"  Error uploading documents for '{filename}': {e}")
+                # Queue one document per call: the sender flushes everything queued in a
+                # single request, so this makes each flush exactly UPLOAD_BATCH_SIZE documents
+                for doc in documents:
+                    sender.upload_documents(documents=[to_upload_document(doc)])
+                if documents:
+                    logger.info(f"  Queued {len(documents)} chunks from '{filename}' for upload.")
 
         logger.info("Indexing complete.")
 
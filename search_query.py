@@ -1,9 +1,15 @@
 import os
+import logging
+import functools
 from dotenv import load_dotenv
 from openai import AzureOpenAI
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
-from azure.search.documents.models import VectorizedQuery
+from azure.search.documents.models import VectorizedQuery, VectorizableTextQuery
+from embedding_cache import get_or_embed
+import query_cache
+
+logger = logging.getLogger(__name__)
 
 # 1. Load Environment Variables
 load_dotenv()
@@ -25,80 +31,96 @@ AZURE_OPENAI_KEY = get_required_env_var("AZURE_OPENAI_API_KEY")
 EMBEDDING_DEPLOYMENT = get_required_env_var("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 AZURE_OPENAI_API_VERSION = "2024-02-01" 
 
-def get_embedding(text):
-    """Generates a vector embedding for the query text."""
-    client = AzureOpenAI(
+@functools.lru_cache(maxsize=1)
+def get_openai_client():
+    """Returns the process-wide Azure OpenAI client (reuses pooled HTTP connections)."""
+    return AzureOpenAI(
         api_key=AZURE_OPENAI_KEY,
         api_version=AZURE_OPENAI_API_VERSION,
         azure_endpoint=AZURE_OPENAI_ENDPOINT
     )
-    
-    response = client.embeddings.create(
-        input=text,
-        model=EMBEDDING_DEPLOYMENT
+
+@functools.lru_cache(maxsize=1)
+def get_search_client():
+    """Returns the process-wide Azure AI Search client (reuses pooled HTTP connections)."""
+    return SearchClient(
+        endpoint=SEARCH_ENDPOINT,
+        index_name=INDEX_NAME,
+        credential=AzureKeyCredential(SEARCH_KEY)
     )
-    return response.data[0].embedding
 
-def search_index(query_text):
-    """Searches the index using Vector Search."""
-    print(f"\n--- Searching for: '{query_text}' ---")
-    
+def get_embedding(text):
+    """Generates a vector embedding for the query text."""
+    return get_or_embed(text, EMBEDDING_DEPLOYMENT, get_openai_client())
+
+def search_index(query_text, namespace=""):
+    """
+    Searches the index using Vector Search and returns a list of
+    {"score", "source", "content"} dicts. Errors from the search service are raised.
+    Results of semantically equivalent recent queries in the same namespace are served from the query cache.
+    """
     # 1. Generate Vector for the query
+    # The local vector drives the embedding and query caches; if it cannot be
+    # generated, fall back to the index's AzureOpenAIVectorizer (server-side).
     try:
         query_vector = get_embedding(query_text)
     except Exception as e:
-        print(f"Error generating embedding: {e}")
-        return
+        logger.warning(f"Error generating embedding, falling back to server-side vectorization: {e}")
+        query_vector = None
 
-    # 2. Initialize Search Client
-    search_client = SearchClient(
-        endpoint=SEARCH_ENDPOINT,
-        index_name=INDEX_NAME,
-        credential=AzureKeyCredential(SEARCH_KEY)
-    )
+    # Vectors from different embedding deployments are not comparable
+    cache_namespace = f"{EMBEDDING_DEPLOYMENT}:{namespace}"
+
+    # The cache is an optimization: any cache fault falls back to a normal search
+    if query_vector is not None:
+        try:
+            cached_results = query_cache.lookup(query_vector, cache_namespace)
+        except Exception as e:
+            logger.warning(f"Query cache lookup failed: {e}")
+            cached_results = None
+        if cached_results is not None:
+            return cached_results
+
+    # 2. Get the shared Search Client
+    search_client = get_search_client()
 
     # 3. Execute Vector Search
     # We ask for the top 3 nearest neighbors (k=3)
-    vector_query = VectorizedQuery(
-        vector=query_vector, 
-        k_nearest_neighbors=3, 
-        fields="embedding"  # MATCHED: Field name in search_indexer.py is "embedding"
-    )
-
-    try:
-        results = search_client.search(
-            search_text=None,  # No keyword search, purely vector
-            vector_queries=[vector_query],
-            select=["id", "content", "source_file"] # MATCHED: Field name in search_indexer.py is "source_file"
+    if query_vector is not None:
+        vector_query = VectorizedQuery(
+            vector=query_vector, 
+            k_nearest_neighbors=3, 
+            fields="embedding"  # MATCHED: Field name in search_indexer.py is "embedding"
+        )
+    else:
+        vector_query = VectorizableTextQuery(
+            text=query_text,
+            k_nearest_neighbors=3,
+            fields="embedding"
         )
 
-        # 4. Process and Return Results
-        output_results = []
-        count = 0
-        for result in results:
-            count += 1
-            score = result['@search.score']
-            source = result.get('source_file', 'Unknown File')
-            content_preview = result.get('content', '')  # Get full content, let UI handle truncation if needed
-            
-            # Keep console logging for debugging
-            print(f"\n[Result {count} | Score: {score:.4f}] File: {source}")
-            print(f"Preview: {content_preview[:200].replace('\n', ' ')}...")
-            
-            output_results.append({
-                "score": score,
-                "source": source,
-                "content": content_preview
-            })
-        
-        if count == 0:
-            print("\nNo results found.")
-            
-        return output_results
+    results = search_client.search(
+        search_text=None,  # No keyword search, purely vector
+        vector_queries=[vector_query],
+        select=["id", "content", "source_file"] # MATCHED: Field name in search_indexer.py is "source_file"
+    )
 
-    except Exception as e:
-        print(f"Error executing search: {e}")
-        return []
+    # 4. Process and Return Results
+    output_results = [
+        {
+            "score": result['@search.score'],
+            "source": result.get('source_file', 'Unknown File'),
+            "content": result.get('content', '')  # Get full content, let UI handle truncation if needed
+        }
+        for result in results
+    ]
+
+    if query_vector is not None:
+        try:
+            query_cache.store(query_text, query_vector, output_results, cache_namespace)
+        except Exception as e:
+            logger.warning(f"Query cache store failed: {e}")
+    return output_results
 
 if __name__ == "__main__":
     # Test queries based on your file names
@@ -108,5 +130,20 @@ if __name__ == "__main__":
         user_query = input("\nEnter a search query (or 'q' to quit): ")
         if user_query.lower() in ['q', 'quit', 'exit']:
             break
-        if user_query:
-            search_index(user_query)
+        if not user_query:
+            continue
+
+        print(f"\n--- Searching for: '{user_query}' ---")
+        try:
+            results = search_index(user_query)
+        except Exception as e:
+            print(f"Error executing search: {e}")
+            continue
+
+        for count, result in enumerate(results, start=1):
+            preview = result['content'][:200].replace('\n', ' ')
+            print(f"\n[Result {count} | Score: {result['score']:.4f}] File: {result['source']}")
+            print(f"Preview: {preview}...")
+
+        if not results:
+            print("\nNo results found.")
@@ -1,5 +1,8 @@
 from openai import AzureOpenAI
 import os
+import functools
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -99,6 +102,73 @@ DATABASE_SCHEMA = """
 --   - RightId (BIGINT): Nested Set Right boundary (Use for downline queries).
 """
 
+# Built once and kept byte-identical across calls so the provider can reuse the cached prompt prefix
+_SYSTEM_MSG = {
+    "role": "system",
+    "content": f"""You are a SQL expert. 
+Given the following database schema, generate a valid SQL query to answer the user's question.
+Do NOT output any markdown, backticks, or explanations. Just the raw SQL query.
+
+Schema:
+{DATABASE_SCHEMA}
+"""
+}
+
+@functools.lru_cache(maxsize=1)
+def _get_client():
+    """Returns the process-wide Azure OpenAI client."""
+    return AzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version="2024-02-01",
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+    )
+
+# Completions are deterministic (temperature=0), so repeat questions are served from memory.
+# Keys ignore case and whitespace; the question sent to the model keeps its original text.
+SQL_CACHE_MAX_ENTRIES = 512
+_sql_cache = OrderedDict()
+_sql_cache_lock = threading.Lock()
+
+def _cache_key(user_question, deployment):
+    return (deployment, " ".join(user_question.lower().split()))
+
+def _cache_get(key):
+    with _sql_cache_lock:
+        if key not in _sql_cache:
+            return None
+        _sql_cache.move_to_end(key)
+        return _sql_cache[key]
+
+def _cache_put(key, sql):
+    with _sql_cache_lock:
+        _sql_cache[key] = sql
+        _sql_cache.move_to_end(key)
+        if len(_sql_cache) > SQL_CACHE_MAX_ENTRIES:
+            _sql_cache.popitem(last=False)
+
+MISSING_CONFIG_ERROR = "Error: OpenAI Environment variables missing."
+
+def _build_request(user_question):
+    """
+    Returns (deployment, messages) for a question, or None if the OpenAI configuration is missing.
+    """
+    api_key = os.getenv("AZURE_OPENAI_API_KEY")
+    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+    deployment = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-35-turbo")
+    
+    # Note: You might need to add AZURE_OPENAI_CHAT_DEPLOYMENT to your .env
+    # using the existing embedding deployment strictly for embeddings won't work for chat completions
+    # if the model doesn't support it.
+    
+    if not api_key or not endpoint:
+        return None
+
+    messages = [
+        _SYSTEM_MSG,
+        {"role": "user", "content": user_question}
+    ]
+    return deployment, messages
+
 def generate_sql_query(user_question):
     """
     Generates a SQL query from a natural language question based on the defined schema.
@@ -106,45 +176,64 @@ def generate_sql_query(user_question):
     
     # Check for OpenAI Config
     try:
-        api_key = os.getenv("AZURE_OPENAI_API_KEY")
-        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-        deployment = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-35-turbo")
-        
-        # Note: You might need to add AZURE_OPENAI_CHAT_DEPLOYMENT to your .env
-        # using the existing embedding deployment strictly for embeddings won't work for chat completions
-        # if the model doesn't support it.
-        
-        if not api_key or not endpoint:
-            return "Error: OpenAI Environment variables missing."
-            
-        client = AzureOpenAI(
-            api_key=api_key,
-            api_version="2024-02-01",
-            azure_endpoint=endpoint
-        )
-
-        system_prompt = f"""You are a SQL expert. 
-Given the following database schema, generate a valid SQL query to answer the user's question.
-Do NOT output any markdown, backticks, or explanations. Just the raw SQL query.
-
-Schema:
-{DATABASE_SCHEMA}
-"""
+        request = _build_request(user_question)
+        if request is None:
+            return MISSING_CONFIG_ERROR
+        deployment, messages = request
 
-        response = client.chat.completions.create(
-            model=deployment, 
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_question}
-            ],
-            temperature=0
-        )
-        
-        return response.choices[0].message.content.strip()
+        key = _cache_key(user_question, deployment)
+        sql = _cache_get(key)
+        if sql is None:
+            response = _get_client().chat.completions.create(
+                model=deployment, 
+                messages=messages,
+                temperature=0
+            )
+            sql = response.choices[0].message.content.strip()
+            # Only successful completions reach the cache
+            _cache_put(key, sql)
+        return sql
 
     except Exception as e:
         return f"Error creating SQL: {str(e)}"
 
+def generate_sql_query_stream(user_question):
+    """
+    Streams the SQL query for a natural language question, yielding text fragments as they arrive.
+    Cached queries are yielded whole; a completed stream is added to the same cache as generate_sql_query.
+    """
+    request = _build_request(user_question)
+    if request is None:
+        yield MISSING_CONFIG_ERROR
+        return
+    deployment, messages = request
+
+    key = _cache_key(user_question, deployment)
+    sql = _cache_get(key)
+    if sql is not None:
+        yield sql
+        return
+
+    stream = _get_client().chat.completions.create(
+        model=deployment,
+        messages=messages,
+        temperature=0,
+        stream=True
+    )
+
+    parts = []
+    for chunk in stream:
+        # Azure sends some chunks (e.g. content filter results) without choices
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield chunk.choices[0].delta.content
+
+    # Only a fully consumed stream with content reaches the cache (e.g. a
+    # content-filtered completion yields nothing and must be retried next time)
+    sql = "".join(parts).strip()
+    if sql:
+        _cache_put(key, sql)
+
 if __name__ == "__main__":
     print("--- SQL Generation Prototype ---")
     q = input("Enter a natural language question: ")
@@ -1,7 +1,8 @@
 import streamlit as st
 import time
+import uuid
 from search_query import search_index
-from sql_helper import generate_sql_query
+from sql_helper import generate_sql_query_stream
 
 # Page Config
 st.set_page_config(
@@ -43,6 +44,11 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_search(prompt, namespace):
+    # Identical prompts within 5 minutes are served without any network calls
+    return search_index(prompt, namespace=namespace)
+
 # Sidebar for Mode Selection
 st.sidebar.title("Configuration")
 mode = st.sidebar.radio("Select Mode", ["Knowledge Base Search", "SQL Query Generator"])
@@ -56,6 +62,10 @@ if mode == "Knowledge Base Search":
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
+    # Per-session namespace for the semantic query cache
+    if "cache_namespace" not in st.session_state:
+        st.session_state.cache_namespace = str(uuid.uuid4())
+
     # Display chat messages from history on app rerun
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
@@ -79,7 +89,7 @@ if mode == "Knowledge Base Search":
             
             # Perform Search
             try:
-                results = search_index(prompt)
+                results = cached_search(prompt, st.session_state.cache_namespace)
                 
                 if results:
                     response_text = f"I found **{len(results)}** relevant documents for your query."
@@ -133,7 +143,9 @@ elif mode == "SQL Query Generator":
             message_placeholder.markdown("Generating SQL...")
             
             try:
-                sql_query = generate_sql_query(prompt)
+                # Stream tokens as they arrive, then re-render the full query as a code block
+                with message_placeholder.container():
+                    sql_query = st.write_stream(generate_sql_query_stream(prompt)).strip()
                 message_placeholder.code(sql_query, language="sql")
                 st.session_state.sql_messages.append({"role": "assistant", "content": sql_query})
             except Exception as e: